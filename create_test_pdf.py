@@ -4,6 +4,7 @@ Utility script to convert a text file to PDF for testing purposes.
 """
 
 import os
+import re
 import argparse
 from fpdf import FPDF
 
@@ -28,21 +29,14 @@ def create_pdf_from_text(text_file, output_pdf):
     pdf.set_margins(10, 10, 10)
     
     # Read text file
-    with open(text_file, "r", encoding="utf-8") as f:
-        text = f.read()
+    with open(text_file, "rb") as f:
+        text = f.read().decode("utf-8")
     
-    # Split text into lines
-    lines = text.split("\n")
+    # Indent bullet points
+    text = re.sub(r"(?m)^(?=[ \t]*•)", "    ", text)
     
-    # Add each line to PDF
-    for line in lines:
-        # Check if line contains bullet point
-        if line.strip().startswith("•"):
-            # Indent bullet points
-            pdf.cell(5)
-        
-        # Add text
-        pdf.multi_cell(0, 5, line)
+    # Add text (multi_cell handles line breaks)
+    pdf.multi_cell(0, 5, text)
     
     # Save PDF
     try:
@@ -8,36 +8,364 @@ import os
 import json
 import csv
 import re
-import nltk
-import pandas as pd
-from tqdm import tqdm
-from rank_bm25 import BM25Okapi
+import io
+import stat
+import time
+import hashlib
+import threading
+import functools
+import numpy as np
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pypdf import PdfReader
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from sklearn.feature_extraction.text import CountVectorizer
-from typing import Dict, List, Tuple, Any, Optional
-
-# Download required NLTK resources
-try:
-    nltk.data.find('tokenizers/punkt')
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('punkt')
-    nltk.download('stopwords')
+from scipy.sparse import csr_matrix
+from typing import BinaryIO, Dict, List, Tuple, Any, Optional, Union
+
+# English stopwords (NLTK's list, bundled to avoid the corpus download)
+_STOPWORDS = frozenset([
+    'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you',
+    "you're", "you've", "you'll", "you'd", 'your', 'yours', 'yourself',
+    'yourselves', 'he', 'him', 'his', 'himself', 'she', "she's", 'her', 'hers',
+    'herself', 'it', "it's", 'its', 'itself', 'they', 'them', 'their',
+    'theirs', 'themselves', 'what', 'which', 'who', 'whom', 'this', 'that',
+    "that'll", 'these', 'those', 'am', 'is', 'are', 'was', 'were', 'be',
+    'been', 'being', 'have', 'has', 'had', 'having', 'do', 'does', 'did',
+    'doing', 'a', 'an', 'the', 'and', 'but', 'if', 'or', 'because', 'as',
+    'until', 'while', 'of', 'at', 'by', 'for', 'with', 'about', 'against',
+    'between', 'into', 'through', 'during', 'before', 'after', 'above',
+    'below', 'to', 'from', 'up', 'down', 'in', 'out', 'on', 'off', 'over',
+    'under', 'again', 'further', 'then', 'once', 'here', 'there', 'when',
+    'where', 'why', 'how', 'all', 'any', 'both', 'each', 'few', 'more', 'most',
+    'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same', 'so',
+    'than', 'too', 'very', 's', 't', 'can', 'will', 'just', 'don', "don't",
+    'should', "should've", 'now', 'd', 'll', 'm', 'o', 're', 've', 'y', 'ain',
+    'aren', "aren't", 'couldn', "couldn't", 'didn', "didn't", 'doesn',
+    "doesn't", 'hadn', "hadn't", 'hasn', "hasn't", 'haven', "haven't", 'isn',
+    "isn't", 'ma', 'mightn', "mightn't", 'mustn', "mustn't", 'needn',
+    "needn't", 'shan', "shan't", 'shouldn', "shouldn't", 'wasn', "wasn't",
+    'weren', "weren't", 'won', "won't", 'wouldn', "wouldn't"
+])
+
+# Tokenizer shared by indexing and querying
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+# Security keywords and the size of the text window captured after each hit
+_SECURITY_WINDOWS = {
+    'security': 5000,
+    'compliance': 3000,
+    'data protection': 3000,
+    'authentication': 2000,
+    'authorization': 2000,
+    'encryption': 2000,
+}
+_SECURITY_RE = re.compile(
+    r"(?i)\b(" + "|".join(re.escape(key) for key in _SECURITY_WINDOWS) + r")\b"
+)
+
+# Normalized-score thresholds separating low/medium/high confidence; a score
+# must exceed a threshold to move into the next bucket
+CONFIDENCE_THRESHOLDS = np.array([0.4, 0.7])
+CONFIDENCE_LABELS = np.array(['low', 'medium', 'high'])
+
+# Sort order of confidence levels (best first)
+CONFIDENCE_RANK = {"high": 0, "medium": 1, "low": 2}
+
+# Number of extracted security sections kept per mapper
+SECTION_CACHE_SIZE = 32
+
+# Okapi BM25 parameters (same defaults as rank_bm25)
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+# Per-user root of the on-disk caches (documents, indexes, LLM assessments)
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "ctrl_mapping"
+)
+
+# Cache entries older than this are evicted, and directories are pruned at
+# most once per CACHE_PRUNE_INTERVAL seconds per process
+CACHE_MAX_AGE = 30 * 24 * 3600
+CACHE_PRUNE_INTERVAL = 3600
+_last_prune: Dict[str, float] = {}
+
+# Directory for persisted control indexes, keyed on the controls CSV content.
+# Bump _INDEX_FORMAT whenever the index layout or scoring parameters change.
+INDEX_CACHE_DIR = os.path.join(CACHE_DIR, "index")
+INDEX_CACHE_SIZE = 16
+_INDEX_FORMAT = 2
+
+# Page ranges longer than this are extracted in worker processes
+PROCESS_POOL_MIN_PAGES = 50
+
+# Only this much of a document's security text is used in a query
+QUERY_DOC_CHARS = 5000
+
+def private_cache_dir(path: str, create: bool = False) -> bool:
+    """Check that a cache directory can be trusted.
+    
+    Cache file names are predictable content hashes, so a directory another
+    user can write to would let them plant entries. A directory is only
+    trusted if it is a real directory owned by the current user and not
+    accessible to anyone else.
+    
+    Args:
+        path: Cache directory
+        create: Create the directory (mode 0o700) if it is missing, and
+            restrict the mode of an existing one owned by the current user
+        
+    Returns:
+        True if the directory exists and is private to the current user
+    """
+    try:
+        if create:
+            os.makedirs(path, mode=0o700, exist_ok=True)
+        st = os.lstat(path)
+        if not stat.S_ISDIR(st.st_mode):
+            return False
+        if not hasattr(os, "getuid"):  # no POSIX ownership (Windows)
+            return True
+        if st.st_uid != os.getuid():
+            return False
+        if st.st_mode & 0o077:
+            if not create:
+                return False
+            os.chmod(path, 0o700)
+    except OSError:
+        return False
+    return True
+
+def prune_cache_dir(path: str, suffix: str, max_entries: int, max_age: float = CACHE_MAX_AGE) -> None:
+    """Evict old cache entries from a directory.
+    
+    Entries (files ending in suffix) older than max_age are removed, then
+    the oldest ones beyond max_entries. A directory is scanned at most once
+    per CACHE_PRUNE_INTERVAL seconds per process.
+    
+    Args:
+        path: Cache directory
+        suffix: File name suffix of the cache entries
+        max_entries: Number of entries to keep at most
+        max_age: Seconds an entry is kept at most
+    """
+    now = time.time()
+    if now - _last_prune.get(path, 0.0) < CACHE_PRUNE_INTERVAL:
+        return
+    _last_prune[path] = now
+    
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.endswith(suffix) and entry.is_file(follow_symlinks=False):
+                    entries.append((entry.stat(follow_symlinks=False).st_mtime, entry.path))
+    except OSError:
+        return
+    
+    entries.sort(reverse=True)
+    for i, (mtime, entry_path) in enumerate(entries):
+        if i >= max_entries or now - mtime > max_age:
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+
+def write_cache_file(path: str, data: bytes, max_entries: int, max_age: float = CACHE_MAX_AGE) -> None:
+    """Write a cache entry and evict old entries from its directory.
+    
+    The entry is written through a temporary name and renamed into place,
+    so concurrent runs never read a partial file. Nothing is written unless
+    the directory is private to the current user (see private_cache_dir).
+    Caching is best-effort: a failed write is dropped and its temporary
+    file removed.
+    
+    Args:
+        path: Path of the cache entry; its extension identifies the entries
+            pruned from the directory
+        data: Content of the cache entry
+        max_entries: Number of entries to keep in the directory at most
+        max_age: Seconds an entry is kept at most
+    """
+    cache_dir = os.path.dirname(path)
+    if not private_cache_dir(cache_dir, create=True):
+        return
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return
+    prune_cache_dir(cache_dir, os.path.splitext(path)[1], max_entries, max_age)
+
+@functools.lru_cache(maxsize=32)
+def _tokenize_doc(text: str) -> Tuple[str, ...]:
+    """Tokenize document text for querying, reusing recent results.
+    
+    Args:
+        text: Security text of a document
+        
+    Returns:
+        Tuple of tokens (stopwords removed)
+    """
+    return tuple(token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS)
+
+def _extract_page_texts(pdf: Union[str, bytes], start: int, stop: int) -> List[str]:
+    """Extract text from a contiguous range of PDF pages.
+    
+    Each call opens its own reader, so ranges can be extracted concurrently
+    without sharing pypdf's stream position between threads. Worker
+    processes are given the file path, so the document is not pickled to
+    each of them.
+    
+    Args:
+        pdf: Path to the PDF file, or its raw content
+        start: First page index (0-based)
+        stop: Page index to stop at (exclusive)
+        
+    Returns:
+        List of page texts
+    """
+    reader = PdfReader(pdf if isinstance(pdf, str) else io.BytesIO(pdf))
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _read_pdf_bytes(pdf: Union[str, BinaryIO]) -> bytes:
+    """Return the raw content of a PDF given as a path or binary file object.
+    
+    Args:
+        pdf: Path to PDF file, or a readable binary file object
+        
+    Returns:
+        PDF file content
+    """
+    if isinstance(pdf, (str, os.PathLike)):
+        with open(pdf, 'rb') as f:
+            return f.read()
+    pdf.seek(0)
+    return pdf.read()
+
+def clamp_page_range(
+    num_pages: int, 
+    start_page: Optional[int] = None, 
+    end_page: Optional[int] = None
+) -> Tuple[int, int]:
+    """Convert a 1-indexed, inclusive page range to 0-based page bounds.
+    
+    Out-of-range pages are clamped to the document: a start past the last
+    page selects the last page, and an end before the start selects only
+    the start page.
+    
+    Args:
+        num_pages: Number of pages in the document
+        start_page: First page (1-indexed, optional)
+        end_page: Last page (1-indexed, inclusive, optional)
+        
+    Returns:
+        Tuple of (first page index, page index to stop at (exclusive))
+    """
+    if num_pages == 0:
+        return 0, 0
+    if start_page is None:
+        start_page = 1
+    if end_page is None:
+        end_page = num_pages
+    first = max(0, min(start_page - 1, num_pages - 1))
+    last = max(first, min(end_page - 1, num_pages - 1))
+    return first, last + 1
+
+def read_pdf_text(
+    pdf_path: Union[str, BinaryIO], 
+    threads: Optional[int] = None, 
+    start_page: Optional[int] = None, 
+    end_page: Optional[int] = None
+) -> str:
+    """Extract the text of a PDF's pages, preserving page order.
+    
+    Pages are split into contiguous ranges that are extracted concurrently.
+    Ranges of a PDF file longer than PROCESS_POOL_MIN_PAGES pages use a
+    process pool, since pypdf's text extraction is CPU-bound and holds the
+    GIL; the workers read the file themselves. Shorter ranges and in-memory
+    documents use a thread pool sharing the content. Single-page ranges (or
+    threads=1) are extracted serially.
+    
+    Args:
+        pdf_path: Path to PDF file, or a readable binary file object
+        threads: Number of workers (defaults to the CPU count)
+        start_page: First page to extract (1-indexed, optional)
+        end_page: Last page to extract (1-indexed, inclusive, optional)
+        
+    Returns:
+        Text of the selected pages, one trailing newline per page
+    """
+    pdf_bytes = _read_pdf_bytes(pdf_path)
+    num_pages = len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+    
+    first, stop = clamp_page_range(num_pages, start_page, end_page)
+    workers = min(threads or os.cpu_count() or 4, stop - first)
+    
+    if workers <= 1:
+        texts = _extract_page_texts(pdf_bytes, first, stop)
+    else:
+        bounds = [first + (stop - first) * i // workers for i in range(workers + 1)]
+        if isinstance(pdf_path, (str, os.PathLike)) and stop - first > PROCESS_POOL_MIN_PAGES:
+            executor_class, source = ProcessPoolExecutor, os.fspath(pdf_path)
+        else:
+            executor_class, source = ThreadPoolExecutor, pdf_bytes
+        with executor_class(max_workers=workers) as executor:
+            chunks = executor.map(
+                _extract_page_texts, [source] * workers, bounds[:-1], bounds[1:]
+            )
+            texts = [text for chunk in chunks for text in chunk]
+    
+    parts = []
+    for text in texts:
+        parts.append(text)
+        parts.append("\n")
+    return "".join(parts)
 
 class ControlMapper:
     """Maps cloud services to control policies using BM25 retrieval."""
     
-    def __init__(self, controls_csv_path: str):
+    def __init__(
+        self, 
+        controls_csv_path: str, 
+        threads: Optional[int] = None, 
+        index_cache_dir: Optional[str] = INDEX_CACHE_DIR
+    ):
         """Initialize the ControlMapper with control policies.
         
         Args:
             controls_csv_path: Path to CSV file containing control policies
+            threads: Number of threads for PDF text extraction (defaults to CPU count)
+            index_cache_dir: Directory to persist the BM25 index in, so it is
+                only built once per controls file (None disables persistence).
+                It is only used if it is private to the current user.
         """
+        self.threads = threads
+        self._section_cache: "OrderedDict[Tuple[str, float], str]" = OrderedDict()
+        self._section_cache_lock = threading.Lock()
         self.controls = self._load_controls(controls_csv_path)
         self.tokenized_controls = [self._preprocess_text(ctrl) for ctrl in self.controls]
-        self.bm25 = BM25Okapi(self.tokenized_controls)
+        
+        index_path = None
+        if index_cache_dir:
+            with open(controls_csv_path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            index_path = os.path.join(index_cache_dir, f"{digest}-v{_INDEX_FORMAT}.npz")
+        
+        if index_path is None or not self._load_index(index_path):
+            self._build_index(self.tokenized_controls)
+            if index_path is not None:
+                self._save_index(index_path)
+        
+        # MaxScore pruning is only sound when no term can lower a score
+        # (floored IDFs are negative when the mean IDF is, in tiny corpora)
+        self._prunable = bool(self._wq.min(initial=0) >= 0)
         
     def _load_controls(self, csv_path: str) -> List[Dict[str, Any]]:
         """Load control policies from CSV.
@@ -65,6 +393,211 @@ class ControlMapper:
                         continue
         return controls
     
+    def _build_index(self, tokenized_controls: List[List[str]]) -> None:
+        """Build a precomputed BM25 weight matrix over the tokenized controls.
+        
+        Each cell holds the full BM25 contribution of a term to a control
+        (IDF times saturated term frequency), so scoring a query only needs
+        to sum the columns of its terms. Candidates are found on an int8
+        copy of the matrix and rescored with the float32 weights.
+        
+        Args:
+            tokenized_controls: List of token lists, one per control
+        """
+        # Columns are allocated only for non-stopword terms, so the matrix
+        # width is the size of the filtered vocabulary. Columns are ordered by
+        # ascending document frequency (then alphabetically), which puts the
+        # rare, high-IDF terms first.
+        doc_freq = Counter(
+            token for tokens in tokenized_controls for token in set(tokens)
+            if token not in _STOPWORDS
+        )
+        terms = sorted(doc_freq, key=lambda token: (doc_freq[token], token))
+        self._vocab: Dict[str, int] = {token: col for col, token in enumerate(terms)}
+        self._df = np.array([doc_freq[token] for token in terms], dtype=np.int32)
+        
+        # Column-major layout keeps each term's weights contiguous for the
+        # column-at-a-time accumulation in _top_controls
+        num_docs, vocab_size = len(tokenized_controls), len(self._vocab)
+        tf = np.zeros((num_docs, vocab_size), dtype=np.float32, order='F')
+        for doc_idx, tokens in enumerate(tokenized_controls):
+            for token in tokens:
+                col = self._vocab.get(token)
+                if col is not None:
+                    tf[doc_idx, col] += 1
+        
+        doc_len = tf.sum(axis=1)
+        avgdl = float(doc_len.mean()) if doc_len.any() else 1.0
+        
+        # Okapi IDF; negative values (terms in more than half of the controls)
+        # are floored to a fraction of the average IDF, as in rank_bm25
+        idf = np.log(num_docs - self._df + 0.5) - np.log(self._df + 0.5)
+        if vocab_size:
+            idf[idf < 0] = BM25_EPSILON * idf.mean()
+        
+        denom = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len[:, None] / avgdl)
+        weight = (idf * tf * (BM25_K1 + 1) / denom).astype(np.float32)
+        
+        # Row-major float32 weights, for rescoring a few candidate controls
+        self._weight = np.ascontiguousarray(weight)
+        
+        # Quantize weights to int8 with a single scale factor for the
+        # candidate search; rounding moves each cell by at most half a unit
+        self._scale = float(np.abs(weight).max(initial=0.0)) / 127.0 or 1.0
+        self._wq = np.asfortranarray(np.round(weight / self._scale).astype(np.int8))
+        
+        # Largest contribution of each term to any control (MaxScore bounds)
+        self._ms = self._wq.max(axis=0, initial=0).astype(np.int32)
+    
+    def _save_index(self, index_path: str) -> None:
+        """Persist the BM25 index to disk.
+        
+        Nothing is written unless the index directory is private to the
+        current user (see private_cache_dir).
+        
+        Args:
+            index_path: Path of the .npz file to write
+        """
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            terms=np.array(list(self._vocab), dtype=str),
+            df=self._df,
+            weight=self._weight,
+            wq=self._wq,
+            ms=self._ms,
+            scale=np.float64(self._scale)
+        )
+        write_cache_file(index_path, buffer.getvalue(), INDEX_CACHE_SIZE)
+    
+    def _load_index(self, index_path: str) -> bool:
+        """Load a persisted BM25 index from disk.
+        
+        Args:
+            index_path: Path of the .npz file to read
+            
+        Returns:
+            True if the index was loaded, False if it is missing, unreadable
+                or in an untrusted directory
+        """
+        if not private_cache_dir(os.path.dirname(index_path)):
+            return False
+        try:
+            with np.load(index_path) as index:
+                terms = index['terms'].tolist()
+                self._df = index['df']
+                self._weight = index['weight']
+                self._wq = index['wq']
+                self._ms = index['ms']
+                self._scale = float(index['scale'])
+        except (OSError, ValueError, KeyError):
+            return False
+        self._vocab = {token: col for col, token in enumerate(terms)}
+        return True
+    
+    def _query_columns(self, query_tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Map query tokens to index columns.
+        
+        Args:
+            query_tokens: Preprocessed query tokens
+            
+        Returns:
+            Tuple of (unique column indices, number of occurrences of each)
+        """
+        q_idx = [self._vocab[token] for token in query_tokens if token in self._vocab]
+        cols, counts = np.unique(np.array(q_idx, dtype=np.intp), return_counts=True)
+        return cols, counts.astype(np.int32)
+    
+    def _top_controls(
+        self, 
+        cols: np.ndarray, 
+        counts: np.ndarray, 
+        top_n: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the top N controls for a query using MaxScore pruning.
+        
+        Query terms are accumulated in decreasing order of their maximum
+        possible contribution, ties broken by ascending document frequency
+        (the column order). Once no control outside the current top N can
+        overtake it with the remaining terms, only the top N controls are
+        scored against those terms. Indexes with negative weights are scored
+        exhaustively.
+        
+        Scores are accumulated on the int8 weights, whose rounding can shift
+        the difference between two controls' scores by up to one unit per
+        query term occurrence. Pruning keeps that margin, and the controls
+        within it of the top N are rescored with the float32 weights, so the
+        result matches exact float32 scoring.
+        
+        Args:
+            cols: Unique query term columns
+            counts: Number of occurrences of each query term
+            top_n: Number of top controls to return
+            
+        Returns:
+            Tuple of (control indices, scores), sorted by descending score
+        """
+        num_docs = self._wq.shape[0]
+        k = max(0, min(top_n, num_docs))
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        
+        bounds = self._ms[cols] * counts
+        order = np.argsort(-bounds, kind='stable')
+        cols, counts, bounds = cols[order], counts[order], bounds[order]
+        # remaining[i]: upper bound on the score still to come after term i
+        remaining = np.append(np.cumsum(bounds[::-1])[::-1][1:], 0)
+        
+        # Largest quantization error between two controls' scores (int units)
+        margin = int(counts.sum())
+        
+        # Accumulate quantized scores in int32
+        scores = np.zeros(num_docs, dtype=np.int32)
+        top_idx = None
+        for i in range(len(cols)):
+            scores += self._wq[:, cols[i]].astype(np.int32) * counts[i]
+            if k == num_docs or i + 1 == len(cols) or not self._prunable:
+                continue
+            
+            part = np.partition(scores, (num_docs - k - 1, num_docs - k))
+            if part[num_docs - k - 1] + remaining[i] + margin < part[num_docs - k]:
+                top_idx = np.argpartition(-scores, k - 1)[:k]
+                rest = slice(i + 1, None)
+                scores[top_idx] += self._wq[np.ix_(top_idx, cols[rest])].astype(np.int32) @ counts[rest]
+                break
+        
+        # Without pruning, every control within the margin of the k-th score
+        # could still be in the exact top N
+        if top_idx is None:
+            kth = np.partition(scores, num_docs - k)[num_docs - k]
+            top_idx = np.flatnonzero(scores >= kth - margin)
+        return self._rescore(top_idx, cols, counts, k)
+    
+    def _rescore(
+        self, 
+        candidates: np.ndarray, 
+        cols: np.ndarray, 
+        counts: np.ndarray, 
+        k: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score candidate controls with the unquantized weights and keep the top k.
+        
+        Args:
+            candidates: Candidate control indices
+            cols: Unique query term columns
+            counts: Number of occurrences of each query term
+            k: Number of top controls to return
+            
+        Returns:
+            Tuple of (control indices, scores), sorted by descending score,
+            ties broken by ascending control index
+        """
+        # Sum in float64 so exactly tied controls stay tied (and are broken by
+        # index) whatever the summation order
+        exact = self._weight[np.ix_(candidates, cols)].astype(np.float64) @ counts
+        order = np.lexsort((candidates, -exact))[:k]
+        return candidates[order], exact[order]
+    
     def _preprocess_text(self, text_dict: Dict[str, Any]) -> List[str]:
         """Preprocess text for BM25 indexing.
         
@@ -75,45 +608,72 @@ class ControlMapper:
             List of tokens
         """
         text = text_dict.get('description', '')
-        if not text:
-            return []
-            
+        
         # Tokenize and remove stopwords
-        tokens = word_tokenize(text.lower())
-        stop_words = set(stopwords.words('english'))
-        return [token for token in tokens if token.isalnum() and token not in stop_words]
+        return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
     
-    def extract_security_section(self, pdf_path: str) -> str:
+    def extract_security_section(self, pdf_path: Union[str, BinaryIO]) -> str:
         """Extract security-related sections from cloud service documentation.
         
+        Results for PDF paths are cached on the path and modification time,
+        so the document is parsed only once while it is unchanged. In-memory
+        documents are not cached. The cache can be shared between threads.
+        
+        Args:
+            pdf_path: Path to PDF documentation, or a readable binary file object
+            
+        Returns:
+            String containing security-related content
+        """
+        if not isinstance(pdf_path, (str, os.PathLike)):
+            return self._extract_security_section(pdf_path)
+        
+        key = (os.path.abspath(pdf_path), os.path.getmtime(pdf_path))
+        with self._section_cache_lock:
+            if key in self._section_cache:
+                self._section_cache.move_to_end(key)
+                return self._section_cache[key]
+        
+        security_text = self._extract_security_section(pdf_path)
+        
+        with self._section_cache_lock:
+            self._section_cache[key] = security_text
+            if len(self._section_cache) > SECTION_CACHE_SIZE:
+                self._section_cache.popitem(last=False)
+        return security_text
+    
+    def _extract_security_section(self, pdf_path: Union[str, BinaryIO]) -> str:
+        """Extract security-related sections from a PDF (uncached).
+        
+        Args:
+            pdf_path: Path to PDF documentation, or a readable binary file object
+            
+        Returns:
+            String containing security-related content
+        """
+        return self.find_security_sections(read_pdf_text(pdf_path, self.threads))
+    
+    def find_security_sections(self, full_text: str) -> str:
+        """Select security-related sections from documentation text.
+        
         Args:
-            pdf_path: Path to PDF documentation
+            full_text: Full text of the service documentation
             
         Returns:
             String containing security-related content
         """
-        reader = PdfReader(pdf_path)
-        full_text = ""
-        security_text = ""
-        
-        # Extract all text from PDF
-        for page in reader.pages:
-            full_text += page.extract_text() + "\n"
-        
-        # Look for security section
-        security_patterns = [
-            r'(?i)security[^\n.]*(?:\n|.){1,5000}',
-            r'(?i)compliance[^\n.]*(?:\n|.){1,3000}',
-            r'(?i)data protection[^\n.]*(?:\n|.){1,3000}',
-            r'(?i)authentication[^\n.]*(?:\n|.){1,2000}',
-            r'(?i)authorization[^\n.]*(?:\n|.){1,2000}',
-            r'(?i)encryption[^\n.]*(?:\n|.){1,2000}'
-        ]
-        
-        for pattern in security_patterns:
-            matches = re.finditer(pattern, full_text)
-            for match in matches:
-                security_text += match.group(0) + "\n\n"
+        # Look for security sections in a single pass over the text. Hits that
+        # fall inside the previous window of the same keyword are skipped.
+        sections = []
+        window_end = dict.fromkeys(_SECURITY_WINDOWS, 0)
+        for match in _SECURITY_RE.finditer(full_text):
+            keyword = match.group(1).lower()
+            start = match.start()
+            if start < window_end[keyword]:
+                continue
+            window_end[keyword] = start + _SECURITY_WINDOWS[keyword]
+            sections.append(full_text[start:window_end[keyword]])
+        security_text = "\n\n".join(sections)
         
         # If no security section found, use a chunk of the full text
         if not security_text and full_text:
@@ -125,57 +685,148 @@ class ControlMapper:
     def map_controls(
         self, 
         service_name: str, 
-        doc_pdf_path: str, 
+        doc_pdf_path: Union[str, BinaryIO], 
         analyst_note: str, 
-        top_n: int = 10
+        top_n: int = 10,
+        doc_text: Optional[str] = None,
+        query_tokens: Optional[List[str]] = None
     ) -> Dict[str, Dict[str, str]]:
         """Map cloud service to control policies.
         
         Args:
             service_name: Name of the cloud service
-            doc_pdf_path: Path to service documentation PDF
+            doc_pdf_path: Path to service documentation PDF, or a readable
+                binary file object holding it
             analyst_note: Analyst's note about service
             top_n: Number of top controls to consider
+            doc_text: Already extracted documentation text; when given, the
+                PDF is not parsed
+            query_tokens: Already tokenized query (see tokenize_query); when
+                given, the documentation is not read at all
             
         Returns:
             Dictionary mapping service to controls with confidence levels
         """
-        # Extract security section from PDF
-        security_text = self.extract_security_section(doc_pdf_path)
+        if query_tokens is None:
+            # Extract security section from the documentation
+            if doc_text is not None:
+                security_text = self.find_security_sections(doc_text)
+            else:
+                security_text = self.extract_security_section(doc_pdf_path)
+            
+            # Combine security text with analyst note for query
+            query_tokens = self.tokenize_query(service_name, analyst_note, security_text)
         
-        # Combine security text with analyst note for query
-        query_text = f"{service_name} {analyst_note} {security_text[:5000]}"
-        query_tokens = self._preprocess_text({'description': query_text})
+        return {service_name: self._score(query_tokens, top_n)}
+    
+    def tokenize_query(self, service_name: str, analyst_note: str, security_text: str) -> List[str]:
+        """Tokenize the BM25 query for a service.
         
-        # Get BM25 scores for controls
-        scores = self.bm25.get_scores(query_tokens)
+        The query is the service name, the analyst note and the start of the
+        documentation's security text. The document part is tokenized through
+        a small LRU cache, so runs with different notes against the same
+        document tokenize it only once.
         
-        # Normalize scores to determine confidence levels
-        max_score = max(scores) if scores else 1.0
-        norm_scores = [score / max_score for score in scores]
+        Args:
+            service_name: Name of the cloud service
+            analyst_note: Analyst's note about service
+            security_text: Security-related content of the documentation
+            
+        Returns:
+            List of query tokens
+        """
+        query_tokens = self._preprocess_text({'description': f"{service_name} {analyst_note}"})
+        query_tokens.extend(_tokenize_doc(security_text[:QUERY_DOC_CHARS]))
+        return query_tokens
+    
+    def _score(self, query_tokens: List[str], top_n: int) -> Dict[int, str]:
+        """Score a tokenized query and assign confidence levels to the top controls.
         
-        # Create sorted list of (control_id, score) tuples
-        scored_controls = list(zip(range(len(self.controls)), norm_scores))
-        scored_controls.sort(key=lambda x: x[1], reverse=True)
+        Args:
+            query_tokens: Tokens from tokenize_query
+            top_n: Number of top controls to consider
+            
+        Returns:
+            Dictionary mapping control ids to confidence levels
+        """
+        # Get the top N controls by BM25 score
+        cols, counts = self._query_columns(query_tokens)
+        top_idx, top_scores = self._top_controls(cols, counts, top_n)
         
-        # Get top N controls
-        top_controls = scored_controls[:top_n]
+        # Format the output
+        return self._confidence_levels(top_idx, top_scores)
+    
+    def map_controls_batch(
+        self, 
+        services: List[Tuple[str, Union[str, BinaryIO], str]], 
+        top_n: int = 10
+    ) -> Dict[str, Dict[str, str]]:
+        """Map several cloud services to control policies at once.
+        
+        All queries are scored in a single sparse-dense matrix product
+        instead of one scoring pass per service.
+        
+        Args:
+            services: List of (service_name, doc_pdf_path, analyst_note) tuples
+            top_n: Number of top controls to consider per service
+            
+        Returns:
+            Dictionary mapping each service to controls with confidence levels
+        """
+        # Build a (num_services, vocab_size) matrix of query term counts
+        rows, cols, counts = [], [], []
+        for row, (service_name, doc_pdf_path, analyst_note) in enumerate(services):
+            security_text = self.extract_security_section(doc_pdf_path)
+            query_cols, query_counts = self._query_columns(
+                self.tokenize_query(service_name, analyst_note, security_text)
+            )
+            rows.extend([row] * len(query_cols))
+            cols.extend(query_cols.tolist())
+            counts.extend(query_counts.tolist())
+        queries = csr_matrix(
+            (np.array(counts, dtype=np.int32), (rows, cols)),
+            shape=(len(services), len(self._vocab))
+        )
+        
+        # Score every service against every control: (num_services, num_controls)
+        all_scores = np.asarray(queries @ self._wq.T)
+        
+        # Select the top N controls for each service by rescoring the controls
+        # within the quantization margin of the k-th score (see _top_controls)
+        num_docs = self._wq.shape[0]
+        k = max(0, min(top_n, num_docs))
+        results = {}
+        for row, (service_name, _, _) in enumerate(services):
+            if k == 0:
+                results[service_name] = {}
+                continue
+            query = queries.getrow(row)
+            query_cols, query_counts = query.indices, query.data
+            scores = all_scores[row]
+            kth = np.partition(scores, num_docs - k)[num_docs - k]
+            candidates = np.flatnonzero(scores >= kth - int(query_counts.sum()))
+            results[service_name] = self._confidence_levels(
+                *self._rescore(candidates, query_cols, query_counts, k)
+            )
+        return results
+    
+    def _confidence_levels(self, top_idx: np.ndarray, top_scores: np.ndarray) -> Dict[int, str]:
+        """Assign confidence levels to ranked controls.
+        
+        Args:
+            top_idx: Control indices, sorted by descending score
+            top_scores: Scores of those controls
+            
+        Returns:
+            Dictionary mapping control index to confidence level
+        """
+        # Normalize scores to determine confidence levels
+        max_score = top_scores[0] if len(top_scores) else 0.0
+        norm_scores = top_scores / max_score if max_score > 0 else top_scores
         
         # Assign confidence levels based on normalized scores
-        result = {}
-        for control_id, score in top_controls:
-            if score > 0.7:
-                confidence = "high"
-            elif score > 0.4:
-                confidence = "medium"
-            else:
-                confidence = "low"
-                
-            if control_id not in result:
-                result[control_id] = confidence
-                
-        # Format the output
-        return {service_name: result}
+        buckets = np.searchsorted(CONFIDENCE_THRESHOLDS, norm_scores, side='left')
+        return dict(zip(top_idx.tolist(), CONFIDENCE_LABELS[buckets].tolist()))
     
     def get_control_description(self, control_id: int) -> str:
         """Get description of a control by ID.
@@ -201,11 +852,12 @@ def main():
     parser.add_argument('--note', required=True, help='Analyst note about the service')
     parser.add_argument('--output', help='Output JSON file path')
     parser.add_argument('--top_n', type=int, default=10, help='Number of top controls to consider')
+    parser.add_argument('--threads', type=int, default=os.cpu_count(), help='Number of threads for PDF text extraction')
     
     args = parser.parse_args()
     
     # Initialize control mapper
-    mapper = ControlMapper(args.controls)
+    mapper = ControlMapper(args.controls, threads=args.threads)
     
     # Map controls for service
     result = mapper.map_controls(args.service, args.doc, args.note, args.top_n)
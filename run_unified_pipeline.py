@@ -5,17 +5,50 @@ Supports extraction of specific page ranges from PDFs.
 """
 
 import os
+import sys
 import json
+import logging
 import argparse
+import hashlib
+import heapq
+import asyncio
 import tempfile
-from ctrl_mapping import ControlMapper
-from llm_enhanced_mapping import LLMEnhancedMapper
-from pypdf import PdfReader, PdfWriter
+import threading
+import functools
+from ctrl_mapping import (
+    CACHE_DIR,
+    CONFIDENCE_RANK,
+    ControlMapper,
+    clamp_page_range,
+    private_cache_dir,
+    read_pdf_text,
+    write_cache_file
+)
+from llm_enhanced_mapping import LLM_CACHE_DIR, LLMEnhancedMapper
+import orjson
+import pikepdf
+
+try:
+    import uvicorn
+    from fastapi import FastAPI, HTTPException
+except ImportError:  # only needed for the serve mode
+    uvicorn = None
+    FastAPI = HTTPException = None
+
+log = logging.getLogger(__name__)
+
+# Extracts up to this size stay in memory; larger ones spill to disk
+EXTRACT_SPOOL_SIZE = 50 * 1024 * 1024
 
 def extract_pdf_pages(input_pdf_path, start_page=None, end_page=None):
     """
-    Extracts a specific page range from a PDF and returns a temporary file path.
-    If no page range is specified, returns the original PDF path.
+    Extracts a specific page range from a PDF into a temporary file object.
+    If no page range is specified, or the range covers the whole document,
+    returns the original PDF path.
+    
+    The extract is written to a SpooledTemporaryFile, so typical extracts
+    are kept in memory and only very large ones are written to disk. The
+    caller is responsible for closing it.
     
     Args:
         input_pdf_path: Path to the input PDF file
@@ -23,7 +56,8 @@ def extract_pdf_pages(input_pdf_path, start_page=None, end_page=None):
         end_page: Last page to extract (1-indexed, inclusive, optional)
         
     Returns:
-        Path to the extracted PDF (or original if no extraction was done)
+        Binary file object holding the extracted PDF (or the original path
+        if no page range is specified or it covers the whole document)
     """
     # If no page range specified, return the original PDF path
     if start_page is None and end_page is None:
@@ -34,41 +68,222 @@ def extract_pdf_pages(input_pdf_path, start_page=None, end_page=None):
         raise FileNotFoundError(f"PDF file not found: {input_pdf_path}")
     
     try:
-        with open(input_pdf_path, "rb") as input_file:
-            reader = PdfReader(input_file)
-            total_pages = len(reader.pages)
-            
-            # Validate page range
-            if start_page is None:
-                start_page = 1
-            if end_page is None:
-                end_page = total_pages
-                
-            # Convert to 0-based index and ensure within bounds
-            start_idx = max(0, min(start_page - 1, total_pages - 1))
-            end_idx = max(start_idx, min(end_page - 1, total_pages - 1))
+        with pikepdf.open(input_pdf_path) as src:
+            total_pages = len(src.pages)
             
-            # Create a temporary output file
-            temp_output = tempfile.NamedTemporaryFile(suffix='.pdf', delete=False)
-            temp_output_path = temp_output.name
-            temp_output.close()
+            # Convert to a 0-based, half-open range within bounds (clamped
+            # the same way as the text-only path)
+            start_idx, stop_idx = clamp_page_range(total_pages, start_page, end_page)
             
-            # Extract the specified pages
-            writer = PdfWriter()
-            for page_num in range(start_idx, end_idx + 1):
-                writer.add_page(reader.pages[page_num])
+            # A range covering the whole document needs no extraction
+            if start_idx == 0 and stop_idx == total_pages:
+                return input_pdf_path
             
-            with open(temp_output_path, "wb") as output_file:
-                writer.write(output_file)
+            # Extract the specified pages (qpdf copies the page objects natively
+            # and shares them with the source instead of re-serializing it)
+            extract = tempfile.SpooledTemporaryFile(max_size=EXTRACT_SPOOL_SIZE, suffix='.pdf')
+            with pikepdf.Pdf.new() as dst:
+                dst.pages.extend(src.pages[start_idx:stop_idx])
+                dst.save(
+                    extract,
+                    linearize=False,
+                    object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                    deterministic_id=True
+                )
+            extract.seek(0)
                 
-            print(f"Extracted pages {start_page}-{end_page} from PDF ({end_idx - start_idx + 1} pages total)")
-            return temp_output_path
+            log.info("Extracted pages %d-%d from PDF (%d pages total)", start_idx + 1, stop_idx, stop_idx - start_idx)
+            return extract
             
     except Exception as e:
-        print(f"Error extracting PDF pages: {e}")
+        log.warning("Error extracting PDF pages: %s", e)
         return input_pdf_path  # Fall back to original PDF
 
-def run_unified_pipeline(
+# Directory for cached document text, shared across pipeline runs, and the
+# number of documents kept in it
+TEXT_CACHE_DIR = os.path.join(CACHE_DIR, "text")
+TEXT_CACHE_SIZE = 256
+
+def extract_pdf_text(input_pdf_path, start_page=None, end_page=None, threads=None):
+    """
+    Extracts the text of a PDF page range, caching it on disk.
+    
+    The cache is keyed on the SHA-1 of the file content and the page range,
+    so repeated runs over the same document skip PDF parsing entirely. The
+    cache is only used while TEXT_CACHE_DIR is private to the current user.
+    
+    Args:
+        input_pdf_path: Path to the input PDF file, or a readable binary
+            file object holding it
+        start_page: First page to extract (1-indexed, optional)
+        end_page: Last page to extract (1-indexed, inclusive, optional)
+        threads: Number of PDF text extraction workers (defaults to the CPU
+            count)
+        
+    Returns:
+        Text of the selected pages
+    """
+    if isinstance(input_pdf_path, str):
+        with open(input_pdf_path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    else:
+        input_pdf_path.seek(0)
+        digest = hashlib.sha1(input_pdf_path.read()).hexdigest()
+    cache_path = os.path.join(TEXT_CACHE_DIR, f"{digest}-{start_page or 1}-{end_page or 'end'}.txt")
+    
+    if private_cache_dir(TEXT_CACHE_DIR):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return f.read()
+        except (OSError, ValueError):
+            pass
+    
+    doc_text = read_pdf_text(input_pdf_path, threads, start_page=start_page, end_page=end_page)
+    
+    write_cache_file(cache_path, doc_text.encode("utf-8"), TEXT_CACHE_SIZE)
+    return doc_text
+
+# Serializes mapper lookups, so concurrent pipelines on a cold cache build
+# the mapper only once
+_mapper_lock = threading.Lock()
+
+def _get_mapper(controls_file, mtime, threads=None):
+    """
+    Returns a ControlMapper for a controls file, reused across pipeline runs.
+    
+    The modification time is part of the cache key, so an edited controls
+    file gets a freshly built mapper. Safe to call from several threads.
+    
+    Args:
+        controls_file: Path to CSV file with control policies
+        mtime: Modification time of the controls file
+        threads: Number of PDF text extraction workers (defaults to the CPU
+            count)
+        
+    Returns:
+        ControlMapper instance
+    """
+    with _mapper_lock:
+        return _build_mapper(controls_file, mtime, threads)
+
+@functools.lru_cache(maxsize=8)
+def _build_mapper(controls_file, mtime, threads):
+    """Builds the ControlMapper cached by _get_mapper."""
+    return ControlMapper(controls_file, threads=threads)
+
+@functools.lru_cache(maxsize=8)
+def _get_llm_mapper(
+    controls_file,
+    mtime,
+    llm_endpoint,
+    llm_batch=False,
+    llm_cache_dir=LLM_CACHE_DIR,
+    llm_cache_ttl=None,
+    threads=None
+):
+    """
+    Returns an LLMEnhancedMapper, reused across pipeline runs.
+    
+    Sharing the mapper means concurrent runs share its LLM concurrency limit.
+    
+    Args:
+        controls_file: Path to CSV file with control policies
+        mtime: Modification time of the controls file
+        llm_endpoint: Endpoint URL for LLM API (optional)
+        llm_batch: Submit LLM assessments through the Batch API
+        llm_cache_dir: Directory persisting LLM assessments (None disables it)
+        llm_cache_ttl: Seconds a persisted LLM assessment stays valid
+        threads: Number of PDF text extraction workers of the base mapper
+        
+    Returns:
+        LLMEnhancedMapper instance
+    """
+    return LLMEnhancedMapper(
+        _get_mapper(controls_file, mtime, threads),
+        llm_endpoint,
+        llm_batch=llm_batch,
+        llm_cache_dir=llm_cache_dir,
+        llm_cache_ttl=llm_cache_ttl
+    )
+
+def _retrieve_controls(
+    base_mapper,
+    service_name,
+    doc_file,
+    analyst_note,
+    top_n_bm25,
+    start_page=None,
+    end_page=None,
+    text_only=False,
+    threads=None
+):
+    """
+    Runs the blocking first stage of the pipeline: page extraction, document
+    parsing and BM25 retrieval.
+    
+    Args:
+        base_mapper: ControlMapper instance
+        service_name: Name of the cloud service
+        doc_file: Path to service documentation PDF
+        analyst_note: Analyst's note about potential threats
+        top_n_bm25: Number of controls to retrieve with BM25
+        start_page: First page to analyze (1-indexed, optional)
+        end_page: Last page to analyze (1-indexed, inclusive, optional)
+        text_only: Read the text of the page range directly instead of
+            writing the pages to a temporary PDF
+        threads: Number of PDF text extraction workers (defaults to the CPU
+            count)
+        
+    Returns:
+        Tuple of (security section of the document, BM25 results)
+    """
+    # Extract relevant pages from PDF if needed
+    doc_text = None
+    extracted_doc = None
+    if doc_file.lower().endswith('.pdf') and (start_page is not None or end_page is not None):
+        if text_only:
+            # Skip the temporary PDF and hand the page text straight to the mappers
+            log.info("   Reading text of pages %s to %s from document...", start_page or 1, end_page or "end")
+            doc_text = extract_pdf_text(doc_file, start_page, end_page, threads)
+        else:
+            log.info("   Extracting pages %s to %s from document...", start_page or 1, end_page or "end")
+            processed_doc = extract_pdf_pages(doc_file, start_page, end_page)
+            
+            # If the pages were extracted, use them and ensure cleanup
+            if processed_doc is not doc_file:
+                extracted_doc = processed_doc
+    doc_source = doc_file if extracted_doc is None else extracted_doc
+    
+    try:
+        # Parse the document once and share its text with both mappers
+        if doc_text is None and doc_file.lower().endswith('.pdf'):
+            doc_text = extract_pdf_text(doc_source, threads=threads)
+        
+        # Select the security section and tokenize the query once for both stages
+        if doc_text is not None:
+            security_text = base_mapper.find_security_sections(doc_text)
+        else:
+            security_text = base_mapper.extract_security_section(doc_source)
+        query_tokens = base_mapper.tokenize_query(service_name, analyst_note, security_text)
+        
+        # BM25 retrieval
+        log.info("2. Running BM25 retrieval to identify candidate controls...")
+        bm25_results = base_mapper.map_controls(
+            service_name, 
+            doc_source, 
+            analyst_note,
+            top_n=top_n_bm25,
+            query_tokens=query_tokens
+        )
+        log.info("   Identified %d potential control matches", len(bm25_results.get(service_name, {})))
+        return security_text, bm25_results
+    
+    finally:
+        # Release the extracted pages
+        if extracted_doc is not None:
+            extracted_doc.close()
+
+async def run_unified_pipeline_async(
     controls_file: str,
     service_name: str,
     doc_file: str,
@@ -78,11 +293,22 @@ def run_unified_pipeline(
     top_n_llm: int = 5,
     llm_endpoint: str = None,
     start_page: int = None,
-    end_page: int = None
+    end_page: int = None,
+    text_only: bool = False,
+    llm_batch: bool = False,
+    llm_cache_dir: str = LLM_CACHE_DIR,
+    llm_cache_ttl: float = None,
+    threads: int = None,
+    base_mapper: ControlMapper = None,
+    llm_mapper: LLMEnhancedMapper = None
 ):
     """
     Run the complete pipeline with BM25 retrieval followed by LLM enhancement.
     
+    Document extraction and BM25 retrieval run in a worker thread and LLM
+    assessments are awaited concurrently, so several pipelines can be
+    gathered on one event loop without blocking each other.
+    
     Args:
         controls_file: Path to CSV file with control policies
         service_name: Name of the cloud service
@@ -94,155 +320,458 @@ def run_unified_pipeline(
         llm_endpoint: Endpoint URL for LLM API (optional)
         start_page: First page to analyze (1-indexed, optional)
         end_page: Last page to analyze (1-indexed, inclusive, optional)
+        text_only: Read the text of the page range directly instead of
+            writing the pages to a temporary PDF
+        llm_batch: Submit LLM assessments through the provider's Batch API
+        llm_cache_dir: Directory persisting LLM assessments across runs
+            (None disables it)
+        llm_cache_ttl: Seconds a persisted LLM assessment stays valid
+            (None keeps it indefinitely)
+        threads: Number of PDF text extraction workers (defaults to the CPU
+            count)
+        base_mapper: ControlMapper to use instead of the shared one for
+            controls_file (optional)
+        llm_mapper: LLMEnhancedMapper to use instead of the shared one; the
+            LLM options above are then ignored (optional)
     
     Returns:
         Dictionary with final control mappings
     """
-    print(f"\n1. Initializing pipeline for {service_name}...")
+    # Create the output directory up front, so an unwritable location fails
+    # before any retrieval or LLM work is done
+    if output_file:
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
     
-    # Extract relevant pages from PDF if needed
-    if doc_file.lower().endswith('.pdf') and (start_page is not None or end_page is not None):
-        print(f"   Extracting pages {start_page or 1} to {end_page or 'end'} from document...")
-        processed_doc = extract_pdf_pages(doc_file, start_page, end_page)
+    log.info("1. Initializing pipeline for %s...", service_name)
+    
+    # Stage 1: document extraction and BM25 retrieval, in a worker thread so
+    # that other pipelines on the event loop keep running
+    if base_mapper is None or llm_mapper is None:
+        controls_mtime = os.path.getmtime(controls_file)
+    if base_mapper is None:
+        base_mapper = await asyncio.to_thread(_get_mapper, controls_file, controls_mtime, threads)
+    log.info("   Loaded %d control policies", len(base_mapper.controls))
+    security_text, bm25_results = await asyncio.to_thread(
+        _retrieve_controls,
+        base_mapper,
+        service_name,
+        doc_file,
+        analyst_note,
+        top_n_bm25,
+        start_page,
+        end_page,
+        text_only,
+        threads
+    )
+    
+    # Stage 2: LLM enhancement
+    log.info("3. Enhancing top controls with LLM analysis...")
+    if llm_mapper is None:
+        llm_mapper = _get_llm_mapper(
+            controls_file, controls_mtime, llm_endpoint, llm_batch, llm_cache_dir, llm_cache_ttl, threads
+        )
+    enhanced_results = await llm_mapper.enhance_control_mapping_async(
+        service_name,
+        doc_file,
+        analyst_note,
+        bm25_results,
+        max_enhanced_controls=top_n_llm,
+        security_doc=security_text
+    )
+    
+    # Format and combine the final results
+    final_results = {
+        service_name: {}
+    }
+    simple_results = {
+        service_name: {}
+    }
+    
+    log.info("4. Building final control mappings with justifications...")
+    
+    # Get enhanced control results
+    enhanced_controls = enhanced_results.get(service_name, {})
+    
+    # Process all BM25 results in one pass, filling the detailed and simple
+    # results and ranking each final confidence once
+    ranks = {}
+    for control_id, confidence in bm25_results.get(service_name, {}).items():
+        control_desc = base_mapper.get_control_description(int(control_id))
         
-        # If a temporary file was created, use it and ensure cleanup
-        if processed_doc != doc_file:
-            temp_file_created = True
-            doc_file = processed_doc
+        # Check if this control was enhanced by LLM (enhanced results are
+        # keyed by the string control id)
+        enhanced_data = enhanced_controls.get(str(control_id))
+        if enhanced_data is not None:
+            # Use LLM confidence if available, otherwise use BM25 confidence
+            entry = {
+                "confidence": enhanced_data.get("llm_confidence", confidence),
+                "applicable": enhanced_data.get("llm_applicable", True),
+                "description": control_desc,
+                "justification": enhanced_data.get("justification", "Based on BM25 retrieval score")
+            }
         else:
-            temp_file_created = False
-    else:
-        temp_file_created = False
-    
-    try:
-        # Initialize the BM25 control mapper
-        base_mapper = ControlMapper(controls_file)
-        print(f"   Loaded {len(base_mapper.controls)} control policies")
+            # Include BM25-only result
+            entry = {
+                "confidence": confidence,
+                "applicable": True,  # Assume applicable by default
+                "description": control_desc,
+                "justification": "Based on BM25 retrieval score"
+            }
+        final_results[service_name][control_id] = entry
         
-        # Stage 1: BM25 retrieval
-        print("\n2. Running BM25 retrieval to identify candidate controls...")
-        bm25_results = base_mapper.map_controls(
-            service_name, 
-            doc_file, 
-            analyst_note,
-            top_n=top_n_bm25
-        )
-        print(f"   Identified {len(bm25_results.get(service_name, {}))} potential control matches")
+        # Only include applicable controls in the simple results
+        if entry["applicable"]:
+            simple_results[service_name][control_id] = entry["confidence"]
+        ranks[control_id] = CONFIDENCE_RANK[entry["confidence"]]
+    
+    # Save results if output file provided
+    if output_file:
+        with open(output_file, "wb") as f:
+            f.write(orjson.dumps(final_results, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        log.info("5. Results saved to: %s", output_file)
+    
+    # Log summary of results (skipped entirely unless INFO is enabled)
+    if log.isEnabledFor(logging.INFO):
+        log.info("CONTROL MAPPING SUMMARY:")
+        log.info("-" * 80)
+        log.info("Cloud Service: %s", service_name)
+        log.info("Total controls analyzed: %d", len(base_mapper.controls))
+        log.info("Controls matched by BM25: %d", len(bm25_results.get(service_name, {})))
+        log.info("Controls enhanced by LLM: %d", len(enhanced_controls))
+        log.info("Final applicable controls: %d", len(simple_results.get(service_name, {})))
+        log.info("-" * 80)
+        log.info("TOP CONTROL MATCHES:")
         
-        # Stage 2: LLM enhancement
-        print("\n3. Enhancing top controls with LLM analysis...")
-        llm_mapper = LLMEnhancedMapper(base_mapper, llm_endpoint)
-        enhanced_results = llm_mapper.enhance_control_mapping(
-            service_name,
-            doc_file,
-            analyst_note,
-            bm25_results,
-            max_enhanced_controls=top_n_llm
+        # Log top 5 control matches
+        top_controls = heapq.nsmallest(
+            5,
+            final_results[service_name].items(),
+            key=lambda x: ranks[x[0]]
         )
         
-        # Format and combine the final results
-        final_results = {
-            service_name: {}
-        }
-        
-        print("\n4. Building final control mappings with justifications...")
+        for control_id, control_data in top_controls:
+            log.info("Control %s: %s", control_id, control_data["description"])
+            log.info("  Confidence: %s", control_data["confidence"].upper())
+            log.info("  Justification: %s", control_data["justification"])
+    
+    # Return both detailed and simple results
+    return {
+        "detailed": final_results,
+        "simple": simple_results
+    }
+
+def run_unified_pipeline(
+    controls_file: str,
+    service_name: str,
+    doc_file: str,
+    analyst_note: str,
+    output_file: str = None,
+    top_n_bm25: int = 10,
+    top_n_llm: int = 5,
+    llm_endpoint: str = None,
+    start_page: int = None,
+    end_page: int = None,
+    text_only: bool = False,
+    llm_batch: bool = False,
+    llm_cache_dir: str = LLM_CACHE_DIR,
+    llm_cache_ttl: float = None,
+    threads: int = None
+):
+    """
+    Run the complete pipeline with BM25 retrieval followed by LLM enhancement.
+    
+    Synchronous wrapper around run_unified_pipeline_async; see it for the
+    arguments.
+    
+    Returns:
+        Dictionary with final control mappings
+    """
+    return asyncio.run(run_unified_pipeline_async(
+        controls_file,
+        service_name,
+        doc_file,
+        analyst_note,
+        output_file,
+        top_n_bm25,
+        top_n_llm,
+        llm_endpoint,
+        start_page,
+        end_page,
+        text_only,
+        llm_batch,
+        llm_cache_dir,
+        llm_cache_ttl,
+        threads
+    ))
+
+def run_unified_pipeline_batch(controls_file: str, requests: list):
+    """
+    Run the pipeline for several services against the same controls file.
+    
+    The ControlMapper (and its BM25 index) is built once and shared by all
+    requests.
+    
+    Args:
+        controls_file: Path to CSV file with control policies
+        requests: List of dictionaries with run_unified_pipeline keyword
+            arguments (service_name, doc_file, analyst_note, ...)
+    
+    Returns:
+        List of pipeline results, in request order
+    """
+    return [run_unified_pipeline(controls_file, **request) for request in requests]
+
+def _service_request(service):
+    """
+    Converts a service entry ("service", "doc", "note" and optional
+    "output", "start_page", "end_page") to run_unified_pipeline arguments.
+    
+    Args:
+        service: Dictionary describing one service
         
-        # Get enhanced control results
-        enhanced_controls = enhanced_results.get(service_name, {})
+    Returns:
+        Dictionary with run_unified_pipeline keyword arguments
+    """
+    return {
+        "service_name": service["service"],
+        "doc_file": service["doc"],
+        "analyst_note": service["note"],
+        "output_file": service.get("output"),
+        "start_page": service.get("start_page"),
+        "end_page": service.get("end_page")
+    }
+
+def load_services(services_file):
+    """
+    Loads pipeline requests from a JSON services file.
+    
+    The file holds a list of objects with "service", "doc" and "note" keys,
+    plus optional "output", "start_page" and "end_page".
+    
+    Args:
+        services_file: Path to the JSON services file
         
-        # Process all BM25 results
-        for control_id_str, confidence in bm25_results.get(service_name, {}).items():
-            control_id = int(control_id_str)
-            control_desc = base_mapper.get_control_description(control_id)
-            
-            # Check if this control was enhanced by LLM
-            if control_id_str in enhanced_controls:
-                enhanced_data = enhanced_controls[control_id_str]
-                
-                # Use LLM confidence if available, otherwise use BM25 confidence
-                final_results[service_name][control_id_str] = {
-                    "confidence": enhanced_data.get("llm_confidence", confidence),
-                    "applicable": enhanced_data.get("llm_applicable", True),
-                    "description": control_desc,
-                    "justification": enhanced_data.get("justification", "Based on BM25 retrieval score")
-                }
-            else:
-                # Include BM25-only result
-                final_results[service_name][control_id_str] = {
-                    "confidence": confidence,
-                    "applicable": True,  # Assume applicable by default
-                    "description": control_desc,
-                    "justification": "Based on BM25 retrieval score"
-                }
+    Returns:
+        List of dictionaries with run_unified_pipeline keyword arguments
+    """
+    with open(services_file, "r", encoding="utf-8") as f:
+        services = json.load(f)
+    
+    return [_service_request(service) for service in services]
+
+async def _run_services(controls_file, requests, output_file=None, **options):
+    """
+    Run the pipeline for several services concurrently.
+    
+    Each service's results are printed, and appended to output_file as one
+    ND-JSON line, as soon as its pipeline completes, so no results are held
+    beyond their own service.
+    
+    Args:
+        controls_file: Path to CSV file with control policies
+        requests: List of dictionaries with run_unified_pipeline keyword
+            arguments (service_name, doc_file, analyst_note, ...)
+        output_file: Path of the ND-JSON file for all services (optional)
+        **options: Pipeline options shared by all services
+    """
+    out = None
+    if output_file:
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        out = open(output_file, "wb")
+    
+    try:
+        print("\nSIMPLIFIED RESULTS:")
+        for future in asyncio.as_completed([
+            run_unified_pipeline_async(controls_file, **request, **options)
+            for request in requests
+        ]):
+            results = await future
+            if out is not None:
+                out.write(orjson.dumps(results["detailed"], option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE))
+                out.flush()
+            print(json.dumps(results["simple"], indent=2))
+    finally:
+        if out is not None:
+            out.close()
+
+def _resolve_doc(doc_root, doc):
+    """
+    Resolves a document path sent to the service against the document root.
+    
+    Args:
+        doc_root: Directory the service may read documents from
+        doc: Document path, relative to doc_root
         
-        # Save results if output file provided
-        if output_file:
-            os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
-            with open(output_file, "w") as f:
-                json.dump(final_results, f, indent=2)
-            print(f"\n5. Results saved to: {output_file}")
+    Returns:
+        Absolute path of the document, or None if it lies outside doc_root
+    """
+    root = os.path.realpath(doc_root)
+    path = os.path.realpath(os.path.join(root, doc))
+    try:
+        if os.path.commonpath([root, path]) != root:
+            return None
+    except ValueError:  # different drives
+        return None
+    return path
+
+def create_app(controls_file, doc_root=".", **options):
+    """
+    Creates the FastAPI app for the persistent service mode.
+    
+    The control mappers (and the BM25 index) are built once at startup,
+    kept on app.state and used by every request; concurrent requests
+    overlap on the server's event loop and share the LLM concurrency limit.
+    
+    Requests only return their results: the service never writes output
+    files, and documents are only read from within doc_root.
+    
+    Args:
+        controls_file: Path to CSV file with control policies
+        doc_root: Directory documents are read from; request "doc" paths are
+            relative to it
+        **options: Pipeline options shared by all requests
         
-        # Generate simple version of results for easy reference
-        simple_results = {
-            service_name: {
-                ctrl_id: ctrl_data["confidence"] 
-                for ctrl_id, ctrl_data in final_results[service_name].items()
-                if ctrl_data.get("applicable", True)  # Only include applicable controls
-            }
-        }
+    Returns:
+        FastAPI application
+    """
+    if FastAPI is None:
+        raise ImportError("fastapi and uvicorn are required for the serve mode")
+    
+    app = FastAPI(title="Unified Control Mapping Pipeline")
+    controls_mtime = os.path.getmtime(controls_file)
+    threads = options.get("threads")
+    app.state.mapper = _get_mapper(controls_file, controls_mtime, threads)
+    app.state.llm_mapper = _get_llm_mapper(
+        controls_file,
+        controls_mtime,
+        options.pop("llm_endpoint", None),
+        options.pop("llm_batch", False),
+        options.pop("llm_cache_dir", LLM_CACHE_DIR),
+        options.pop("llm_cache_ttl", None),
+        threads
+    )
+    
+    @app.post("/map")
+    async def map_service(service: dict):
+        """Maps one service, given as a services-file entry without "output", to control policies."""
+        if "output" in service:
+            raise HTTPException(status_code=422, detail="The output field is not supported by the service")
+        try:
+            request = _service_request(service)
+        except KeyError as e:
+            raise HTTPException(status_code=422, detail=f"Missing field: {e.args[0]}")
+        for field in ("service", "doc", "note"):
+            if not isinstance(service[field], str):
+                raise HTTPException(status_code=422, detail=f"Field {field} must be a string")
+        for field in ("start_page", "end_page"):
+            value = service.get(field)
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+                raise HTTPException(status_code=422, detail=f"Field {field} must be an integer or null")
+        del request["output_file"]
         
-        # Print summary of results
-        print("\nCONTROL MAPPING SUMMARY:")
-        print("-" * 80)
-        print(f"Cloud Service: {service_name}")
-        print(f"Total controls analyzed: {len(base_mapper.controls)}")
-        print(f"Controls matched by BM25: {len(bm25_results.get(service_name, {}))}")
-        print(f"Controls enhanced by LLM: {len(enhanced_controls)}")
-        print(f"Final applicable controls: {len(simple_results.get(service_name, {}))}")
-        print("-" * 80)
-        print("\nTOP CONTROL MATCHES:")
+        doc_file = _resolve_doc(doc_root, request["doc_file"])
+        if doc_file is None:
+            raise HTTPException(status_code=403, detail="Document is outside the document root")
+        if not os.path.isfile(doc_file):
+            raise HTTPException(status_code=404, detail="Document not found")
+        request["doc_file"] = doc_file
         
-        # Print top 5 control matches
-        sorted_controls = sorted(
-            [(int(cid), final_results[service_name][cid]) for cid in final_results[service_name]],
-            key=lambda x: {"high": 0, "medium": 1, "low": 2}[x[1]["confidence"]]
+        return await run_unified_pipeline_async(
+            controls_file,
+            **request,
+            **options,
+            base_mapper=app.state.mapper,
+            llm_mapper=app.state.llm_mapper
         )
-        
-        for control_id, control_data in sorted_controls[:5]:
-            print(f"\nControl {control_id}: {control_data['description']}")
-            print(f"  Confidence: {control_data['confidence'].upper()}")
-            print(f"  Justification: {control_data['justification']}")
-        
-        # Return both detailed and simple results
-        return {
-            "detailed": final_results,
-            "simple": simple_results
-        }
     
-    finally:
-        # Clean up temporary file if created
-        if temp_file_created and os.path.exists(doc_file):
-            try:
-                os.unlink(doc_file)
-                print("   Temporary file cleanup completed")
-            except Exception as e:
-                print(f"   Warning: Failed to clean up temporary file: {e}")
+    return app
 
-def main():
+def serve(argv):
+    """Entry point for the persistent service mode."""
+    parser = argparse.ArgumentParser(description="Unified Control Mapping Service")
+    parser.add_argument("--controls", required=True, help="Path to controls CSV file")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--doc-root", default=".", help="Directory documents are read from (request doc paths are relative to it)")
+    parser.add_argument("--bm25-top", type=int, default=10, help="Number of top controls from BM25")
+    parser.add_argument("--llm-top", type=int, default=5, help="Number of controls to enhance with LLM")
+    parser.add_argument("--llm-endpoint", help="Endpoint URL for LLM API")
+    parser.add_argument("--text-only", action="store_true", help="Read page text directly instead of writing a temporary PDF")
+    parser.add_argument("--llm-cache-dir", default=LLM_CACHE_DIR, help="Directory persisting LLM assessments across runs (empty to disable)")
+    parser.add_argument("--llm-cache-ttl", type=float, help="Seconds a persisted LLM assessment stays valid")
+    parser.add_argument("--threads", type=int, help="Number of PDF text extraction workers (defaults to CPU count)")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s")
+    if uvicorn is None:
+        parser.error("fastapi and uvicorn are required for the serve mode")
+    
+    app = create_app(
+        args.controls,
+        doc_root=args.doc_root,
+        top_n_bm25=args.bm25_top,
+        top_n_llm=args.llm_top,
+        llm_endpoint=args.llm_endpoint,
+        text_only=args.text_only,
+        llm_cache_dir=args.llm_cache_dir or None,
+        llm_cache_ttl=args.llm_cache_ttl,
+        threads=args.threads
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+def main(argv=None):
     """Main entry point for the unified pipeline."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]:
+        serve(argv[1:])
+        return
+    
     parser = argparse.ArgumentParser(description="Unified Control Mapping Pipeline")
     parser.add_argument("--controls", required=True, help="Path to controls CSV file")
-    parser.add_argument("--service", required=True, help="Name of cloud service")
-    parser.add_argument("--doc", required=True, help="Path to service documentation PDF")
-    parser.add_argument("--note", required=True, help="Analyst note about the service")
-    parser.add_argument("--output", help="Output JSON file path")
+    parser.add_argument("--service", help="Name of cloud service")
+    parser.add_argument("--doc", help="Path to service documentation PDF")
+    parser.add_argument("--note", help="Analyst note about the service")
+    parser.add_argument("--services-file", help="JSON file listing several services to map concurrently")
+    parser.add_argument("--output", help="Output JSON file path (ND-JSON, one line per service, with --services-file)")
     parser.add_argument("--bm25-top", type=int, default=10, help="Number of top controls from BM25")
     parser.add_argument("--llm-top", type=int, default=5, help="Number of controls to enhance with LLM")
     parser.add_argument("--llm-endpoint", help="Endpoint URL for LLM API")
     parser.add_argument("--start-page", type=int, help="First page to analyze (1-indexed)")
     parser.add_argument("--end-page", type=int, help="Last page to analyze (1-indexed, inclusive)")
+    parser.add_argument("--text-only", action="store_true", help="Read page text directly instead of writing a temporary PDF")
+    parser.add_argument("--llm-cache-dir", default=LLM_CACHE_DIR, help="Directory persisting LLM assessments across runs (empty to disable)")
+    parser.add_argument("--llm-cache-ttl", type=float, help="Seconds a persisted LLM assessment stays valid")
+    parser.add_argument("--quiet", action="store_true", help="Only log warnings and errors")
+    parser.add_argument("--llm-batch", action="store_true", help="Submit LLM assessments through the Batch API (offline runs)")
+    parser.add_argument("--threads", type=int, help="Number of PDF text extraction workers (defaults to CPU count)")
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING if args.quiet else logging.INFO, format="%(message)s")
+    
+    if args.services_file:
+        # Run all services from the file on one event loop
+        asyncio.run(_run_services(
+            args.controls,
+            load_services(args.services_file),
+            args.output,
+            top_n_bm25=args.bm25_top,
+            top_n_llm=args.llm_top,
+            llm_endpoint=args.llm_endpoint,
+            text_only=args.text_only,
+            llm_batch=args.llm_batch,
+            llm_cache_dir=args.llm_cache_dir or None,
+            llm_cache_ttl=args.llm_cache_ttl,
+            threads=args.threads
+        ))
+        return
     
-    args = parser.parse_args()
+    if not (args.service and args.doc and args.note):
+        parser.error("--service, --doc and --note are required unless --services-file is given")
     
     # Run unified pipeline
     results = run_unified_pipeline(
@@ -255,7 +784,12 @@ def main():
         args.llm_top,
         args.llm_endpoint,
         args.start_page,
-        args.end_page
+        args.end_page,
+        args.text_only,
+        args.llm_batch,
+        args.llm_cache_dir or None,
+        args.llm_cache_ttl,
+        args.threads
     )
     
     # Print the simplified results for easy reference
@@ -263,4 +797,4 @@ def main():
     print(json.dumps(results["simple"], indent=2))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()